@@ -241,20 +241,6 @@ try:
 except ImportError:
     HAS_FIREWALLD = False
 
-try:
-    from firewall.core.fw_nm import (
-        nm_is_imported,
-        nm_get_connection_of_interface,
-        nm_get_zone_of_connection,
-        nm_set_zone_of_connection,
-        nm_get_interfaces,
-        nm_get_client,
-    )
-
-    NM_IMPORTED = nm_is_imported()
-except ImportError:
-    NM_IMPORTED = False
-
 
 PCI_REGEX = re.compile("[0-9a-fA-F]{4}:[0-9a-fA-F]{4}")
 
@@ -275,28 +261,40 @@ def lsr_parse_version(v_str):
     return v
 
 
-def try_get_connection_of_interface(interface):
+# firewalld's NetworkManager helpers load the NM GObject introspection
+# bindings, which is slow, so they are only imported on first use.
+# Returns None if they are not available.
+def import_fw_nm():
     try:
-        return nm_get_connection_of_interface(interface)
+        from firewall.core import fw_nm
+    except ImportError:
+        return None
+    return fw_nm
+
+
+def try_get_connection_of_interface(nm, interface):
+    try:
+        return nm.nm_get_connection_of_interface(interface)
     except Exception:
         return None
 
 
 def try_set_zone_of_interface(module, _zone, interface):
-    if NM_IMPORTED:
-        connection = try_get_connection_of_interface(interface)
+    nm = import_fw_nm()
+    if nm is not None and nm.nm_is_imported():
+        connection = try_get_connection_of_interface(nm, interface)
         if connection is not None:
             if _zone == "":
                 zone_string = "the default zone"
             else:
                 zone_string = _zone
-            if _zone == nm_get_zone_of_connection(connection):
+            if _zone == nm.nm_get_zone_of_connection(connection):
                 module.log(
                     msg="The interface is under control of NetworkManager and already bound to '%s'"
                     % zone_string
                 )
             elif not module.check_mode:
-                nm_set_zone_of_connection(_zone, connection)
+                nm.nm_set_zone_of_connection(_zone, connection)
             return True
     return False
 
@@ -340,10 +338,11 @@ def handle_interface_permanent(
             fw_settings.addInterface(item)
             fw.config.set_zone_config(fw_zone, fw_settings.settings)
     else:
-        old_zone_name = fw.config().getZoneOfInterface(item)
+        fw_config = fw.config()
+        old_zone_name = fw_config.getZoneOfInterface(item)
         if old_zone_name != zone:
             if old_zone_name:
-                old_zone_obj = fw.config().getZoneByName(old_zone_name)
+                old_zone_obj = fw_config.getZoneByName(old_zone_name)
                 old_zone_settings = old_zone_obj.getSettings()
                 old_zone_settings.removeInterface(item)
                 old_zone_obj.update(old_zone_settings)
@@ -353,12 +352,12 @@ def handle_interface_permanent(
 pci_ids = None
 
 
-def get_interface_pci():
+def get_interface_pci(nm):
     pci_dict = {}
-    for interface in nm_get_interfaces():
+    for interface in nm.nm_get_interfaces():
         # udi/device/[vendor, device]
         interface_ids = []
-        device_udi = nm_get_client().get_device_by_iface(interface).get_udi()
+        device_udi = nm.nm_get_client().get_device_by_iface(interface).get_udi()
         device_path = os.path.join(device_udi, "device")
         for field in ["vendor", "device"]:
             with open(os.path.join(device_path, field)) as _file:
@@ -375,7 +374,12 @@ def parse_pci_id(module, item):
     if PCI_REGEX.search(item):
         global pci_ids
         if not pci_ids:
-            pci_ids = get_interface_pci()
+            nm = import_fw_nm()
+            if nm is None or not nm.nm_is_imported():
+                module.fail_json(
+                    msg="NetworkManager bindings are required for interface_pci_id"
+                )
+            pci_ids = get_interface_pci(nm)
 
         interface_name = pci_ids.get(item)
         if interface_name:
@@ -391,8 +395,8 @@ def parse_pci_id(module, item):
 
 
 def parse_port(module, item):
-    _port, _protocol = item.split("/")
-    if _protocol is None:
+    _port, _sep, _protocol = item.partition("/")
+    if not _protocol:
         module.fail_json(msg="improper port format (missing protocol?)")
     return (_port, _protocol)
 
@@ -490,6 +494,18 @@ def parse_helper_module(module, item):
     return "_".join(_module)
 
 
+# Drop repeated items while keeping the order they were given in, so
+# duplicates in the playbook do not cost extra firewalld calls
+def remove_duplicates(items):
+    unique_items = []
+    seen = set()
+    for item in items:
+        if item not in seen:
+            seen.add(item)
+            unique_items.append(item)
+    return unique_items
+
+
 def get_forward_port(module):
     forward_port = module.params["forward_port"]
     if isinstance(forward_port, list):
@@ -526,8 +542,8 @@ def parse_forward_port(module, item):
         else:
             module.fail_json(msg="improper %s format: %s" % (type_string, item))
 
-        _port, _protocol = __port.split("/")
-        if _protocol is None:
+        _port, _sep, _protocol = __port.partition("/")
+        if not _protocol:
             module.fail_json(msg="improper %s format (missing protocol?)" % type_string)
         if _to_port == "":
             _to_port = None
@@ -654,7 +670,7 @@ def main():
     else:
         # CodeQL will produce an error without this line
         allow_zone_drifting_deprecated = None
-    service = module.params["service"]
+    service = remove_duplicates(module.params["service"])
     short = module.params["short"]
     description = module.params["description"]
     protocol = module.params["protocol"]
@@ -664,12 +680,16 @@ def main():
     port = []
     for port_proto in module.params["port"]:
         port.append(parse_port(module, port_proto))
+    port = remove_duplicates(port)
     source_port = []
     for port_proto in module.params["source_port"]:
         source_port.append(parse_port(module, port_proto))
+    source_port = remove_duplicates(source_port)
     forward_port = []
     for item in get_forward_port(module):
-        forward_port.append(parse_forward_port(module, item))
+        _port, _protocol, _to_port, _to_addr = parse_forward_port(module, item)
+        forward_port.append((_port, _protocol.lower(), _to_port, _to_addr))
+    forward_port = remove_duplicates(forward_port)
     masquerade = module.params["masquerade"]
     rich_rule = []
     for item in module.params["rich_rule"]:
@@ -678,7 +698,8 @@ def main():
             rich_rule.append(rule)
         except Exception as e:
             module.fail_json(msg="Rich Rule '%s' is not valid: %s" % (item, str(e)))
-    source = module.params["source"]
+    rich_rule = remove_duplicates(rich_rule)
+    source = remove_duplicates(module.params["source"])
     destination_ipv4 = None
     destination_ipv6 = None
     for address in module.params["destination"]:
@@ -691,12 +712,12 @@ def main():
             destination_ipv6 = address
         elif destination_ipv6 and ip_type == "ipv6":
             module.fail_json(msg="cannot have more than one destination ipv6")
-    interface = module.params["interface"]
+    interface = remove_duplicates(module.params["interface"])
     for _interface in module.params["interface_pci_id"]:
         for interface_name in parse_pci_id(module, _interface):
             if interface_name not in interface:
                 interface.append(interface_name)
-    icmp_block = module.params["icmp_block"]
+    icmp_block = remove_duplicates(module.params["icmp_block"])
     icmp_block_inversion = module.params["icmp_block_inversion"]
     timeout = module.params["timeout"]
     target = module.params["target"]
@@ -917,6 +938,7 @@ def main():
             fw = Firewall(offline=True)
 
         fw.start()
+        fw_config = fw.config
     else:
         # Pre-run version checking
         if lsr_parse_version(FW_VERSION) < lsr_parse_version("0.2.11"):
@@ -930,6 +952,9 @@ def main():
 
         fw.setExceptionHandler(exception_handler)
 
+        # Resolve the permanent config proxy once and reuse it below
+        fw_config = fw.config()
+
     # Get default zone, the permanent zone and settings
     fw_zone = None
     fw_settings = None
@@ -951,7 +976,7 @@ def main():
             err_str = "Runtime"
         if permanent:
             zone_exists = (
-                zone_exists or zone is None or zone in fw.config().getZoneNames()
+                zone_exists or zone is None or zone in fw_config.getZoneNames()
             )
             err_str = "Permanent"
 
@@ -959,17 +984,18 @@ def main():
             module.fail_json(msg="%s zone '%s' does not exist." % (err_str, zone))
         elif zone_exists:
             zone = zone or fw.getDefaultZone()
-            fw_zone = fw.config().getZoneByName(zone)
+            fw_zone = fw_config.getZoneByName(zone)
             fw_settings = fw_zone.getSettings()
 
     # Firewall modification starts here
 
     changed = False
     need_reload = False
+    # Runtime changes are queued while diffing and issued back-to-back at the end
+    runtime_changes = []
 
     # firewalld.conf
     if firewalld_conf:
-        fw_config = fw.config()
         if not allow_zone_drifting_deprecated and firewalld_conf.get(
             "allow_zone_drifting"
         ) != fw_config.get_property("AllowZoneDrifting"):
@@ -984,7 +1010,7 @@ def main():
     if zone_operation:
         if state == "present" and not zone_exists:
             if not module.check_mode:
-                fw.config().addZone(zone, FirewallClientZoneSettings())
+                fw_config.addZone(zone, FirewallClientZoneSettings())
                 need_reload = True
             changed = True
         elif state == "absent" and zone_exists:
@@ -998,14 +1024,15 @@ def main():
     # set default zone
     if set_default_zone:
         if fw.getDefaultZone() != set_default_zone:
-            set_the_default_zone(fw, set_default_zone)
+            if not module.check_mode:
+                set_the_default_zone(fw, set_default_zone)
             changed = True
 
     # service
     if service_operation and permanent:
-        service_exists = service in fw.config().getServiceNames()
+        service_exists = service in fw_config.getServiceNames()
         if service_exists:
-            fw_service = fw.config().getServiceByName(service)
+            fw_service = fw_config.getServiceByName(service)
             fw_service_settings = fw_service.getSettings()
         elif state == "present":
             fw_service, fw_service_settings = create_service(module, fw, service)
@@ -1108,25 +1135,34 @@ def main():
             if service_exists:
                 fw_service.update(fw_service_settings)
             need_reload = True
-    else:
+    elif service:
+        service_names = set(fw_config.getServiceNames())
+        if runtime:
+            runtime_services = set(fw.getServices(zone))
+        if permanent:
+            permanent_services = set(fw_settings.getServices())
         for item in service:
-            service_exists = item in fw.config().getServiceNames()
+            service_exists = item in service_names
             if state == "enabled" and service_exists:
-                if runtime and not fw.queryService(zone, item):
+                if runtime and item not in runtime_services:
                     if not module.check_mode:
-                        fw.addService(zone, item, timeout)
+                        runtime_changes.append((fw.addService, (zone, item, timeout)))
+                    runtime_services.add(item)
                     changed = True
-                if permanent and not fw_settings.queryService(item):
+                if permanent and item not in permanent_services:
                     if not module.check_mode:
                         fw_settings.addService(item)
+                    permanent_services.add(item)
                     changed = True
             elif state == "disabled" and service_exists:
-                if runtime and fw.queryService(zone, item):
+                if runtime and item in runtime_services:
                     if not module.check_mode:
-                        fw.removeService(zone, item)
-                if permanent and fw_settings.queryService(item):
+                        runtime_changes.append((fw.removeService, (zone, item)))
+                    runtime_services.discard(item)
+                if permanent and item in permanent_services:
                     if not module.check_mode:
                         fw_settings.removeService(item)
+                    permanent_services.discard(item)
                     changed = True
             else:
                 if module.check_mode:
@@ -1139,24 +1175,51 @@ def main():
                     module.fail_json(msg="INVALID SERVICE - " + item)
 
     # port
+    # The fetched lists only give exact matches, queryPort() is still needed
+    # to find ports that are covered by a range or written differently
+    if port and state in ("enabled", "disabled"):
+        if runtime:
+            runtime_ports = set(tuple(item) for item in fw.getPorts(zone))
+        if permanent:
+            permanent_ports = set(tuple(item) for item in fw_settings.getPorts())
     for _port, _protocol in port:
         if state == "enabled":
-            if runtime and not fw.queryPort(zone, _port, _protocol):
+            if (
+                runtime
+                and (_port, _protocol) not in runtime_ports
+                and not fw.queryPort(zone, _port, _protocol)
+            ):
                 if not module.check_mode:
-                    fw.addPort(zone, _port, _protocol, timeout)
+                    runtime_changes.append(
+                        (fw.addPort, (zone, _port, _protocol, timeout))
+                    )
+                runtime_ports.add((_port, _protocol))
                 changed = True
-            if permanent and not fw_settings.queryPort(_port, _protocol):
+            if (
+                permanent
+                and (_port, _protocol) not in permanent_ports
+                and not fw_settings.queryPort(_port, _protocol)
+            ):
                 if not module.check_mode:
                     fw_settings.addPort(_port, _protocol)
+                permanent_ports.add((_port, _protocol))
                 changed = True
         elif state == "disabled":
-            if runtime and fw.queryPort(zone, _port, _protocol):
+            if runtime and (
+                (_port, _protocol) in runtime_ports
+                or fw.queryPort(zone, _port, _protocol)
+            ):
                 if not module.check_mode:
-                    fw.removePort(zone, _port, _protocol)
+                    runtime_changes.append((fw.removePort, (zone, _port, _protocol)))
+                runtime_ports.discard((_port, _protocol))
                 changed = True
-            if permanent and fw_settings.queryPort(_port, _protocol):
+            if permanent and (
+                (_port, _protocol) in permanent_ports
+                or fw_settings.queryPort(_port, _protocol)
+            ):
                 if not module.check_mode:
                     fw_settings.removePort(_port, _protocol)
+                permanent_ports.discard((_port, _protocol))
                 changed = True
 
     # source_port
@@ -1181,37 +1244,62 @@ def main():
                 changed = True
 
     # forward_port
-    if len(forward_port) > 0:
+    if len(forward_port) > 0 and state in ("enabled", "disabled"):
+        # firewalld reports unset toport/toaddr as empty strings. At runtime it
+        # also normalizes the port strings, so queryForwardPort() is still
+        # needed for anything that is not an exact match.
+        if runtime:
+            runtime_forward_ports = set(
+                tuple(item) for item in fw.getForwardPorts(zone)
+            )
+        if permanent:
+            permanent_forward_ports = set(
+                tuple(item) for item in fw_settings.getForwardPorts()
+            )
         for _port, _protocol, _to_port, _to_addr in forward_port:
+            _forward_port = (_port, _protocol, _to_port or "", _to_addr or "")
             if state == "enabled":
-                if runtime and not fw.queryForwardPort(
-                    zone, _port, _protocol, _to_port, _to_addr
+                if (
+                    runtime
+                    and _forward_port not in runtime_forward_ports
+                    and not fw.queryForwardPort(
+                        zone, _port, _protocol, _to_port, _to_addr
+                    )
                 ):
                     if not module.check_mode:
-                        fw.addForwardPort(
-                            zone, _port, _protocol, _to_port, _to_addr, timeout
+                        runtime_changes.append(
+                            (
+                                fw.addForwardPort,
+                                (zone, _port, _protocol, _to_port, _to_addr, timeout),
+                            )
                         )
+                    runtime_forward_ports.add(_forward_port)
                     changed = True
-                if permanent and not fw_settings.queryForwardPort(
-                    _port, _protocol, _to_port, _to_addr
-                ):
+                if permanent and _forward_port not in permanent_forward_ports:
                     if not module.check_mode:
                         fw_settings.addForwardPort(_port, _protocol, _to_port, _to_addr)
+                    permanent_forward_ports.add(_forward_port)
                     changed = True
             elif state == "disabled":
-                if runtime and fw.queryForwardPort(
-                    zone, _port, _protocol, _to_port, _to_addr
+                if runtime and (
+                    _forward_port in runtime_forward_ports
+                    or fw.queryForwardPort(zone, _port, _protocol, _to_port, _to_addr)
                 ):
                     if not module.check_mode:
-                        fw.removeForwardPort(zone, _port, _protocol, _to_port, _to_addr)
+                        runtime_changes.append(
+                            (
+                                fw.removeForwardPort,
+                                (zone, _port, _protocol, _to_port, _to_addr),
+                            )
+                        )
+                    runtime_forward_ports.discard(_forward_port)
                     changed = True
-                if permanent and fw_settings.queryForwardPort(
-                    _port, _protocol, _to_port, _to_addr
-                ):
+                if permanent and _forward_port in permanent_forward_ports:
                     if not module.check_mode:
                         fw_settings.removeForwardPort(
                             _port, _protocol, _to_port, _to_addr
                         )
+                    permanent_forward_ports.discard(_forward_port)
                     changed = True
 
     # masquerade
@@ -1278,32 +1366,41 @@ def main():
                 changed = True
 
     # interface
+    if interface and state in ("enabled", "disabled"):
+        if runtime:
+            runtime_interfaces = set(fw.getInterfaces(zone))
+        if permanent:
+            permanent_interfaces = set(fw_settings.getInterfaces())
     for item in interface:
         if state == "enabled":
-            if runtime and not fw.queryInterface(zone, item):
+            if runtime and item not in runtime_interfaces:
                 if not module.check_mode:
                     fw.changeZoneOfInterface(zone, item)
+                runtime_interfaces.add(item)
                 changed = True
             if permanent:
                 if try_set_zone_of_interface(module, zone, item):
                     changed = True
-                elif not fw_settings.queryInterface(item):
+                elif item not in permanent_interfaces:
                     if not module.check_mode:
                         handle_interface_permanent(
                             zone, item, fw_zone, fw_settings, fw, fw_offline, module
                         )
+                    permanent_interfaces.add(item)
                     changed = True
         elif state == "disabled":
-            if runtime and fw.queryInterface(zone, item):
+            if runtime and item in runtime_interfaces:
                 if not module.check_mode:
                     fw.removeInterface(zone, item)
+                runtime_interfaces.discard(item)
                 changed = True
             if permanent:
                 if try_set_zone_of_interface(module, "", item):
                     changed = True
-                elif fw_settings.queryInterface(item):
+                elif item in permanent_interfaces:
                     if not module.check_mode:
                         fw_settings.removeInterface(item)
+                    permanent_interfaces.discard(item)
                     changed = True
 
     # icmp_block
@@ -1364,8 +1461,12 @@ def main():
                     need_reload = True
                 changed = True
 
-    # apply permanent changes
-    if changed and (zone_operation or permanent):
+    # apply runtime changes
+    for _method, _args in runtime_changes:
+        _method(*_args)
+
+    # apply permanent changes, nothing was modified in check mode
+    if changed and (zone_operation or permanent) and not module.check_mode:
         if fw_zone and fw_settings:
             if fw_offline:
                 fw.config.set_zone_config(fw_zone, fw_settings.settings)
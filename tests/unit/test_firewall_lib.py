@@ -44,12 +44,14 @@ TEST_DATA = {
                     call("default", service, 0) for service in SERVICES_PRESENT
                 ],
                 "permanent": [call(service) for service in SERVICES_PRESENT],
+                "query_mock": {"getServices.return_value": []},
             }
         },
         "disabled": {
             "expected": {
                 "runtime": [call("default", service) for service in SERVICES_PRESENT],
                 "permanent": [call(service) for service in SERVICES_PRESENT],
+                "query_mock": {"getServices.return_value": SERVICES_PRESENT},
             }
         },
     },
@@ -62,6 +64,10 @@ TEST_DATA = {
                     call("default", "161-162", "udp", 0),
                 ],
                 "permanent": [call("8081", "tcp"), call("161-162", "udp")],
+                "query_mock": {
+                    "getPorts.return_value": [],
+                    "queryPort.return_value": False,
+                },
             }
         },
         "disabled": {
@@ -71,6 +77,9 @@ TEST_DATA = {
                     call("default", "161-162", "udp"),
                 ],
                 "permanent": [call("8081", "tcp"), call("161-162", "udp")],
+                "query_mock": {
+                    "getPorts.return_value": [["8081", "tcp"], ["161-162", "udp"]]
+                },
             }
         },
     },
@@ -107,6 +116,10 @@ TEST_DATA = {
                     call("8081", "tcp", "port", "addr"),
                     call("161-162", "udp", "port", "addr"),
                 ],
+                "query_mock": {
+                    "getForwardPorts.return_value": [],
+                    "queryForwardPort.return_value": False,
+                },
             }
         },
         "disabled": {
@@ -119,6 +132,12 @@ TEST_DATA = {
                     call("8081", "tcp", "port", "addr"),
                     call("161-162", "udp", "port", "addr"),
                 ],
+                "query_mock": {
+                    "getForwardPorts.return_value": [
+                        ["8081", "tcp", "port", "addr"],
+                        ["161-162", "udp", "port", "addr"],
+                    ]
+                },
             }
         },
     },
@@ -174,12 +193,14 @@ TEST_DATA = {
         "enabled": {
             "expected": {
                 "runtime": [call("default", "eth2")],
+                "query_mock": {"getInterfaces.return_value": []},
             }
         },
         "disabled": {
             "expected": {
                 "runtime": [call("default", "eth2")],
                 "permanent": [call("eth2")],
+                "query_mock": {"getInterfaces.return_value": ["eth2"]},
             }
         },
     },
@@ -357,6 +378,13 @@ class FirewallLibParsers(unittest.TestCase):
         item = "a/b"
         rc = firewall_lib.parse_port(module, item)
         self.assertEqual(("a", "b"), rc)
+        module.fail_json = Mock(side_effect=MockException())
+        item = "a"
+        with self.assertRaises(MockException):
+            firewall_lib.parse_port(module, item)
+        module.fail_json.assert_called_with(
+            msg="improper port format (missing protocol?)"
+        )
 
     def test_parse_forward_port(self):
         """Test the code that parses port values."""
@@ -370,6 +398,12 @@ class FirewallLibParsers(unittest.TestCase):
         item = "a/b;;"
         rc = firewall_lib.parse_forward_port(module, item)
         self.assertEqual(("a", "b", None, None), rc)
+        item = "a;;"
+        with self.assertRaises(MockException):
+            firewall_lib.parse_forward_port(module, item)
+        module.fail_json.assert_called_with(
+            msg="improper forward_port format (missing protocol?)"
+        )
 
     @patch("firewall_lib.AnsibleModule", new_callable=MockAnsibleModule)
     @patch("firewall_lib.HAS_FIREWALLD", True)
@@ -389,6 +423,20 @@ class FirewallLibParsers(unittest.TestCase):
             firewall_lib.main()
         am.fail_json.assert_called_with(msg="Options invalid without state option set")
 
+    @patch("firewall_lib.AnsibleModule", new_callable=MockAnsibleModule)
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.pci_ids", None)
+    @patch("firewall_lib.import_fw_nm", Mock(return_value=None))
+    def test_parse_pci_id_without_nm(self, am_class):
+        am = am_class.return_value
+
+        am.params = {"interface_pci_id": ["600D:7C1D"]}
+        with self.assertRaises(MockException):
+            firewall_lib.main()
+        am.fail_json.assert_called_with(
+            msg="NetworkManager bindings are required for interface_pci_id"
+        )
+
 
 @patch("firewall_lib.AnsibleModule", new_callable=MockAnsibleModule)
 class FirewallLibMain(unittest.TestCase):
@@ -669,6 +717,209 @@ class FirewallLibMain(unittest.TestCase):
             + " Ensure that you define the service in the playbook before running it in diff mode"
         )
 
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_runtime_changes_applied_after_lookups(self, firewall_class, am_class):
+        am = am_class.return_value
+        am.params = {
+            "service": ["https"],
+            "port": ["8081/tcp"],
+            "forward_port": ["8080/tcp;80;"],
+            "state": "enabled",
+            "permanent": True,
+            "runtime": True,
+        }
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw_config = fw.config.return_value
+        fw_config.getServiceNames.return_value = ["https"]
+        fw_settings = fw_config.getZoneByName.return_value.getSettings()
+        for _mock in (fw, fw_settings):
+            _mock.getServices.return_value = []
+            _mock.getPorts.return_value = []
+            _mock.queryPort.return_value = False
+            _mock.getForwardPorts.return_value = []
+            _mock.queryForwardPort.return_value = False
+        firewall_lib.main()
+
+        names = [name for name, _args, _kwargs in fw.mock_calls]
+        lookups = [
+            idx
+            for idx, name in enumerate(names)
+            if name.split(".")[-1].startswith(("get", "query"))
+        ]
+        runtime_changes = [
+            names.index(name) for name in ("addService", "addPort", "addForwardPort")
+        ]
+        update = names.index("config().getZoneByName().update")
+        assert max(lookups) < min(runtime_changes)
+        assert max(runtime_changes) < update
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.import_fw_nm")
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_interface_runtime_removed_before_nm_change(
+        self, firewall_class, import_fw_nm, am_class
+    ):
+        am = am_class.return_value
+        am.params = {
+            "interface": ["eth2"],
+            "state": "disabled",
+            "permanent": True,
+            "runtime": True,
+        }
+        calls = []
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getInterfaces.return_value = ["eth2"]
+        fw.removeInterface.side_effect = lambda *args: calls.append("runtime")
+        fw_nm = import_fw_nm.return_value
+        fw_nm.nm_get_zone_of_connection.return_value = "default"
+        fw_nm.nm_set_zone_of_connection.side_effect = lambda *args: calls.append("nm")
+        firewall_lib.main()
+        fw.removeInterface.assert_called_once_with("default", "eth2")
+        fw_nm.nm_set_zone_of_connection.assert_called_once()
+        self.assertEqual(["runtime", "nm"], calls)
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_port_in_existing_range(self, firewall_class, am_class):
+        am = am_class.return_value
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getPorts.return_value = [["8000-9000", "tcp"]]
+        fw.queryPort.return_value = True
+        fw_settings = fw.config.return_value.getZoneByName.return_value.getSettings()
+        fw_settings.getPorts.return_value = [("8000-9000", "tcp")]
+        fw_settings.queryPort.return_value = True
+
+        am.params = {
+            "port": ["8081/tcp"],
+            "state": "enabled",
+            "permanent": True,
+            "runtime": True,
+        }
+        firewall_lib.main()
+        fw.addPort.assert_not_called()
+        fw_settings.addPort.assert_not_called()
+        am.exit_json.assert_called_with(changed=False, __firewall_changed=False)
+
+        am.params["state"] = "disabled"
+        firewall_lib.main()
+        fw.removePort.assert_called_once_with("default", "8081", "tcp")
+        fw_settings.removePort.assert_called_once_with("8081", "tcp")
+        am.exit_json.assert_called_with(changed=True, __firewall_changed=True)
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_forward_port_normalized_at_runtime(self, firewall_class, am_class):
+        am = am_class.return_value
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getForwardPorts.return_value = [["80", "tcp", "8080", ""]]
+        fw.queryForwardPort.return_value = True
+
+        am.params = {
+            "forward_port": ["http/tcp;8080;"],
+            "state": "enabled",
+            "runtime": True,
+        }
+        firewall_lib.main()
+        fw.queryForwardPort.assert_called_with("default", "http", "tcp", "8080", None)
+        fw.addForwardPort.assert_not_called()
+        am.exit_json.assert_called_with(changed=False, __firewall_changed=False)
+
+        am.params["state"] = "disabled"
+        firewall_lib.main()
+        fw.removeForwardPort.assert_called_once_with(
+            "default", "http", "tcp", "8080", None
+        )
+        am.exit_json.assert_called_with(changed=True, __firewall_changed=True)
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_service_definition_ports_not_fetched(self, firewall_class, am_class):
+        am = am_class.return_value
+        am.params = {
+            "service": ["customservice"],
+            "port": ["8081/tcp"],
+            "forward_port": ["8080/tcp;80;"],
+            "state": "present",
+            "permanent": True,
+        }
+        fw = firewall_class.return_value
+        fw_config = fw.config.return_value
+        fw_config.getServiceNames.return_value = ["customservice"]
+        fw_settings = fw_config.getZoneByName.return_value.getSettings()
+        firewall_lib.main()
+        fw.getPorts.assert_not_called()
+        fw_settings.getPorts.assert_not_called()
+        fw.getForwardPorts.assert_not_called()
+        fw_settings.getForwardPorts.assert_not_called()
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_duplicate_items_applied_once(self, firewall_class, am_class):
+        am = am_class.return_value
+        am.params = {
+            "port": ["8081/tcp", "443/tcp", "8081/tcp"],
+            "forward_port": ["8080/tcp;80;", "8080/TCP;80;"],
+            "state": "enabled",
+            "runtime": True,
+        }
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getPorts.return_value = []
+        fw.queryPort.return_value = False
+        fw.getForwardPorts.return_value = []
+        fw.queryForwardPort.return_value = False
+        firewall_lib.main()
+        assert [
+            call("default", "8081", "tcp", 0),
+            call("default", "443", "tcp", 0),
+        ] == fw.addPort.call_args_list
+        fw.addForwardPort.assert_called_once_with(
+            "default", "8080", "tcp", "80", None, 0
+        )
+
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.9.0", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_check_mode_does_not_modify(self, firewall_class, am_class):
+        am = am_class.return_value
+        am.params = {
+            "port": ["8081/tcp"],
+            "set_default_zone": "public",
+            "firewalld_conf": {"allow_zone_drifting": True},
+            "state": "enabled",
+            "permanent": True,
+            "runtime": True,
+        }
+        am.check_mode = True
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getPorts.return_value = []
+        fw.queryPort.return_value = False
+        fw_config = fw.config.return_value
+        fw_config.get_property.return_value = "no"
+        fw_zone = fw_config.getZoneByName.return_value
+        fw_settings = fw_zone.getSettings.return_value
+        fw_settings.getPorts.return_value = []
+        fw_settings.queryPort.return_value = False
+        firewall_lib.main()
+        fw.addPort.assert_not_called()
+        fw.setDefaultZone.assert_not_called()
+        fw_config.set_property.assert_not_called()
+        fw_zone.update.assert_not_called()
+        fw.reload.assert_not_called()
+        am.exit_json.assert_called_with(changed=True, __firewall_changed=True)
+
     @patch("firewall_lib.HAS_FIREWALLD", True)
     @patch("firewall_lib.FW_VERSION", "0.9.0", create=True)
     def test_allow_zone_drifting_runtime(self, am_class):
@@ -706,6 +957,29 @@ class FirewallLibMain(unittest.TestCase):
             am.params["firewalld_conf"]["allow_zone_drifting"] = option
             firewall_lib.main()
 
+    @patch("firewall_lib.HAS_FIREWALLD", True)
+    @patch("firewall_lib.FW_VERSION", "0.3.8", create=True)
+    @patch("firewall_lib.FirewallClient", create=True)
+    def test_forward_port_without_toport_toaddr(self, firewall_class, am_class):
+        am = am_class.return_value
+        am.params = {
+            "forward_port": ["8081/tcp;;"],
+            "state": "disabled",
+            "permanent": True,
+            "runtime": True,
+        }
+        fw = firewall_class.return_value
+        fw.getDefaultZone.return_value = "default"
+        fw.getForwardPorts.return_value = [["8081", "tcp", "", ""]]
+        fw_settings = fw.config.return_value.getZoneByName.return_value.getSettings()
+        fw_settings.getForwardPorts.return_value = [("8081", "tcp", "", "")]
+        firewall_lib.main()
+        fw.removeForwardPort.assert_called_once_with(
+            "default", "8081", "tcp", None, None
+        )
+        fw_settings.removeForwardPort.assert_called_once_with("8081", "tcp", None, None)
+        am.exit_json.assert_called_with(changed=True, __firewall_changed=True)
+
 
 @pytest.mark.parametrize("method,state,input,expected", TEST_PARAMS)
 def test_module_parameters(method, state, input, expected):
@@ -786,6 +1060,15 @@ def test_module_parameters(method, state, input, expected):
         rich_rule_patcher.stop()
 
 
+class FirewallLibHelpers(unittest.TestCase):
+    """test module helper functions"""
+
+    def test_remove_duplicates(self):
+        items = ["b", "a", "b", ("c", "d"), "a", ("c", "d")]
+        rc = firewall_lib.remove_duplicates(items)
+        self.assertEqual(["b", "a", ("c", "d")], rc)
+
+
 class FirewallVersionTest(unittest.TestCase):
     """class to test lsr_parse_version"""
 